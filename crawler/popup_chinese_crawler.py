@@ -1,10 +1,24 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio # For running lesson fetches concurrently
+import httpx
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    # selectolax releases without the Lexbor engine only ship the Modest parser, which has the same API.
+    from selectolax.parser import HTMLParser
 import os
-from urllib.parse import urljoin, urlparse
-import time # For adding delays
-import json # For saving the summary
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+import orjson # For saving the summary
 import re # For parsing flashvars
+import socket # For caching DNS lookups
+import functools
+import string # For the filename translation table
+import hashlib # For naming cached pages
+from email.utils import parsedate_to_datetime # For Retry-After dates
+from datetime import datetime, timezone
+from aiolimiter import AsyncLimiter # For spacing out requests to the archive
+import aiofiles # For writing downloads without blocking the event loop
+from concurrent.futures import ProcessPoolExecutor # For parsing detail pages on several CPU cores
+import multiprocessing # For starting the parse workers safely from the event loop
 
 # --- Configuration ---
 # Base URL for the Wayback Machine archive.
@@ -17,57 +31,311 @@ BASE_LESSONS_PATH = "/web/20140630222515/https://popupchinese.com/lessons/"
 # Directory where the downloaded audio files and the summary JSON will be saved.
 DOWNLOAD_DIR = "popup_chinese_audio"
 
+# Pages fetched before are kept here together with their ETag/Last-Modified validators,
+# so re-runs can ask the archive whether a page changed instead of downloading it again.
+PAGE_CACHE_DIR = os.path.join(DOWNLOAD_DIR, 'pages_cache')
+PAGE_VALIDATORS_FILE = os.path.join(DOWNLOAD_DIR, 'etag_cache.json')
+
+# Headers sent with every request. The User-Agent mimics a web browser,
+# which can help prevent some basic blocking mechanisms.
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+# Maximum number of lesson detail pages fetched at the same time.
+# Keeps the crawler polite towards the archive server.
+MAX_CONCURRENT_PAGES = 4
+
+# Maximum number of audio files downloaded at the same time.
+MAX_CONCURRENT_DOWNLOADS = 8
+
+# Request rate towards the archive: at most MAX_REQUESTS_PER_PERIOD requests every
+# REQUEST_RATE_PERIOD seconds on average, with bursts up to MAX_REQUESTS_PER_PERIOD.
+# The default of 20 requests per minute stays well within the archive's limits;
+# raise it for faster crawls, lower it if the archive answers with "429 Too Many Requests".
+MAX_REQUESTS_PER_PERIOD = 20
+REQUEST_RATE_PERIOD = 60.0
+
+# Size of the blocks audio downloads are streamed to disk in (256 KiB).
+# Large blocks mean fewer Python-level loop iterations and bigger write() calls.
+DOWNLOAD_CHUNK_SIZE = 1 << 18
+
+# Write buffer of downloaded audio files (1 MiB), so the kernel gets a few large writes.
+DOWNLOAD_BUFFER_SIZE = 1 << 20
+
+# Number of times a failed connection attempt to the archive is retried
+# inside the connection pool before the request is given up.
+CONNECT_RETRIES = 3
+
+# Idempotent requests answered with "Too Many Requests" or one of these transient server errors
+# are retried up to STATUS_RETRIES times, and those whose response could not be read up to
+# READ_RETRIES times. Between attempts the crawler waits as long as the server's Retry-After
+# header asks, or else RETRY_BACKOFF_FACTOR * 2 ** attempt seconds.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD')
+STATUS_RETRIES = 5
+READ_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 1.5
+
 # Create the download directory if it doesn't already exist.
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+
+# --- CSS Selectors ---
+# Defined once here instead of as string literals inside the parse functions.
+# Listing page
+SEL_ANY_TEASER = 'div[class*="teaser"]'
+# Teaser classes in order of preference, picked from the SEL_ANY_TEASER matches
+TEASER_CLASSES = ('archive_teaser', 'lesson_teaser')
+SEL_TITLE_A = 'div.archive_title a'
+SEL_LESSON_A = 'a[href*="/lessons/"]'
+# Lesson detail page
+SEL_LESSON_TITLE = 'div.lesson_title'
+SEL_AUDIO_SRC = 'audio source[src], audio[src]'
+SEL_FLASH = 'ruffle-embed, embed, object'
+# Both pages
+SEL_LINKS = 'a[href]'
+
+# Markers around the toolbar the Wayback Machine injects into every archived page.
+WAYBACK_TOOLBAR_START = '<!-- BEGIN WAYBACK TOOLBAR INSERT -->'
+WAYBACK_TOOLBAR_END = '<!-- END WAYBACK TOOLBAR INSERT -->'
+
+# --- Regular Expressions ---
+# Compiled once at import instead of on every parse call.
+# Lesson detail page links on listing pages, e.g. '/lessons/absolute-beginners/pulling-a-car'
+LESSON_HREF_RE = re.compile(r'/lessons/[^/]+/[^/]+/?$')
+# Audio URL inside Flash player flashvars, e.g. 'mp3url=http://popupchinese.com/data/1382/audio.mp3'
+MP3URL_RE = re.compile(r'mp3url=([^&\s]+)')
+# Direct links to audio files
+AUDIO_EXT_RE = re.compile(r'\.(mp3|wav|m4a)(\?|$)', re.I)
 
 # --- Helper Functions ---
 
-def get_page_content(url):
+# Token bucket shared by all requests, see MAX_REQUESTS_PER_PERIOD.
+# Unlike a fixed sleep after every request, it only waits when requests are actually sent faster.
+REQUEST_LIMITER = AsyncLimiter(max_rate=MAX_REQUESTS_PER_PERIOD, time_period=REQUEST_RATE_PERIOD)
+
+@functools.lru_cache(maxsize=1024)
+def _cached_urlparse(url):
     """
-    Fetches the HTML content of a given URL.
-    Includes a User-Agent header to mimic a web browser, which can help prevent
-    some basic blocking mechanisms.
+    Memoized urlparse. main and listing_page_url parse the same start URL for every
+    listing page, so it is parsed only once. The result is an immutable named tuple,
+    so it is safe to share.
+    """
+    return urlparse(url)
+
+def install_dns_cache():
+    """
+    Replaces socket.getaddrinfo with a memoized version for the rest of the process.
+    Every new connection to the archive would otherwise repeat the same DNS lookup,
+    which happens often when the archive answers with 5xx errors and drops connections.
+    Failed lookups raise and are therefore not cached.
+    """
+    if hasattr(socket.getaddrinfo, 'cache_info'):
+        return  # Already installed.
+    socket.getaddrinfo = functools.lru_cache(maxsize=64)(socket.getaddrinfo)
+
+def _retry_after_seconds(response):
     """
+    Returns how many seconds the server's Retry-After header asks to wait,
+    or None if the header is missing or invalid. The header holds either
+    a number of seconds or an HTTP date.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        }
-        # Set a timeout for requests to prevent indefinite waiting.
-        response = requests.get(url, headers=headers, timeout=15)
-        # Raise an HTTPError for bad responses (4xx client errors or 5xx server errors).
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryTransport(httpx.AsyncHTTPTransport):
+    """
+    Connection pool transport that also retries GET and HEAD requests answered
+    with a rate limit or transient server error, or whose response could not be read,
+    with exponential backoff. A Retry-After header from the server takes precedence.
+    Retries happen inside the transport, so they reuse the pooled connections.
+    Each retry also waits for the request rate limiter, if one is given, so retries
+    count towards the same rate as the requests that caused them.
+    """
+
+    def __init__(self, *args, limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._limiter = limiter
+
+    async def handle_async_request(self, request):
+        status_retries = STATUS_RETRIES
+        read_retries = READ_RETRIES
+        attempt = 0
+        while True:
+            try:
+                response = await super().handle_async_request(request)
+            except (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                if request.method not in RETRY_METHODS or read_retries == 0:
+                    raise
+                read_retries -= 1
+                reason = type(e).__name__
+                delay = RETRY_BACKOFF_FACTOR * 2 ** attempt
+            else:
+                if (request.method not in RETRY_METHODS or response.status_code not in RETRY_STATUSES
+                        or status_retries == 0):
+                    return response
+                status_retries -= 1
+                reason = f"status {response.status_code}"
+                delay = _retry_after_seconds(response)
+                if delay is None:
+                    delay = RETRY_BACKOFF_FACTOR * 2 ** attempt
+                await response.aclose()
+            print(f"  - {request.method} {request.url} failed ({reason}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            if self._limiter is not None:
+                await self._limiter.acquire()
+            attempt += 1
+
+def create_client():
+    """
+    Creates the single HTTP client shared by the whole crawl.
+    The User-Agent header is set once on the client, and its pooled transport
+    keeps connections to the archive alive and retries failed connection attempts
+    and transient server errors, so every request reuses an already established TCP/TLS socket where possible.
+    HTTP/2 is enabled so concurrent requests to the archive are multiplexed over
+    one connection; hosts without HTTP/2 support are still reached over HTTP/1.1.
+    """
+    # With HTTP/2 concurrent requests share a connection, so a small pool is enough.
+    # Idle connections are kept for 30 seconds (httpx defaults to 5), so they survive
+    # the pauses of the rate limiter and between listing pages.
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30)
+    transport = RetryTransport(limits=limits, retries=CONNECT_RETRIES, http2=True, limiter=REQUEST_LIMITER)
+    return httpx.AsyncClient(transport=transport, timeout=30, headers=HEADERS, follow_redirects=True)
+
+# Validators (ETag and Last-Modified) of the cached pages, by URL.
+# Loaded by load_page_validators() and written back by save_page_validators().
+PAGE_VALIDATORS = {}
+
+def load_page_validators():
+    """
+    Loads the validators of the pages cached by earlier runs.
+    An unreadable validator file is treated as empty: pages are then fetched in full again.
+    """
+    if os.path.exists(PAGE_VALIDATORS_FILE):
+        try:
+            with open(PAGE_VALIDATORS_FILE, 'rb') as f:
+                PAGE_VALIDATORS.update(orjson.loads(f.read()))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Warning: ignoring unreadable page cache validators in {PAGE_VALIDATORS_FILE}: {e}")
+
+def save_page_validators():
+    """
+    Saves the validators of the cached pages for the next run.
+    The file is written under a temporary name and then renamed over the old one,
+    so an interrupted save never leaves a truncated validator file behind.
+    """
+    partial_path = PAGE_VALIDATORS_FILE + '.part'
+    with open(partial_path, 'wb') as f:
+        f.write(orjson.dumps(PAGE_VALIDATORS))
+    os.replace(partial_path, PAGE_VALIDATORS_FILE)
+
+def _page_cache_path(url):
+    """
+    Returns the file a page is cached in, named after a hash of its URL.
+    """
+    return os.path.join(PAGE_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.html')
+
+async def fetch(client, url):
+    """
+    Fetches the HTML content of a given URL using the shared async client.
+    The client carries the User-Agent header and keeps connections alive,
+    so repeated requests to the archive reuse the same TCP/TLS socket.
+    Pages cached by an earlier run are requested conditionally: on
+    '304 Not Modified' the cached copy is returned without transferring the page again.
+    """
+    cache_path = _page_cache_path(url)
+    validators = PAGE_VALIDATORS.get(url)
+    request_headers = {}
+    if validators and os.path.exists(cache_path):
+        if validators.get('etag'):
+            request_headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            request_headers['If-Modified-Since'] = validators['last_modified']
+    try:
+        async with REQUEST_LIMITER:
+            response = await client.get(url, headers=request_headers)
+        if response.status_code == 304:
+            try:
+                with open(cache_path, encoding='utf-8') as f:
+                    return f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                # The cached copy is gone or damaged: forget its validators and fetch the page in full.
+                print(f"Could not read cached copy of {url}: {e}")
+                PAGE_VALIDATORS.pop(url, None)
+                return await fetch(client, url)
+        # Raise an HTTPStatusError for bad responses (4xx client errors or 5xx server errors).
         response.raise_for_status()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            try:
+                with open(cache_path, 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+                PAGE_VALIDATORS[url] = {'etag': etag, 'last_modified': last_modified}
+            except OSError as e:
+                # The page itself was fetched fine; it just will not be requested conditionally next time.
+                print(f"Could not cache {url}: {e}")
+                PAGE_VALIDATORS.pop(url, None)
         return response.text
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching {url}: {e}")
-        return None 
+        return None
+
+def strip_wayback_toolbar(html_content):
+    """
+    Removes the toolbar the Wayback Machine injects into archived pages.
+    None of the lesson data is inside it, so cutting it out before parsing
+    keeps the parser from building a tree for markup that is never queried.
+    """
+    start = html_content.find(WAYBACK_TOOLBAR_START)
+    if start == -1:
+        return html_content
+    end = html_content.find(WAYBACK_TOOLBAR_END, start)
+    if end == -1:
+        return html_content
+    return html_content[:start] + html_content[end + len(WAYBACK_TOOLBAR_END):]
 
 def parse_lessons_page(html_content, current_page_url):
     """
-    Parses a lesson listing page to find individual lesson links (title and URL)
-    and the link to the next pagination page.
+    Parses a lesson listing page to find individual lesson links (title and URL).
     Updated with multiple selectors to handle different page layouts.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    tree = HTMLParser(strip_wayback_toolbar(html_content))
     lessons_on_page = []
-    next_page_link = None
+    seen_lesson_urls = set() # The same lesson can be linked from more than one element.
 
     # --- 1. Find Lesson Items with multiple selector strategies ---
+    # A single tree walk collects every teaser div; div.archive_teaser and div.lesson_teaser
+    # are both matched by it, so the preferred containers are picked from its results.
+    teaser_elements = tree.css(SEL_ANY_TEASER)
     lesson_elements = []
-    
-    # Strategy 1: Original selector
-    lesson_elements = soup.select('div.archive_teaser')
-    if not lesson_elements:
-        # Strategy 2: Look for other common lesson containers
-        lesson_elements = soup.select('div.lesson_teaser')
+    for teaser_class in TEASER_CLASSES:
+        # Strategy 1: div.archive_teaser, Strategy 2: div.lesson_teaser
+        lesson_elements = [el for el in teaser_elements if teaser_class in (el.attributes.get('class') or '').split()]
+        if lesson_elements:
+            break
     if not lesson_elements:
         # Strategy 3: Look for any div containing lesson links
-        lesson_elements = soup.select('div[class*="teaser"]')
+        lesson_elements = teaser_elements
     if not lesson_elements:
         # Strategy 4: Find all links that contain lesson URLs
-        lesson_links = soup.find_all('a', href=re.compile(r'/lessons/[^/]+/[^/]+/?$'))
-        for link in lesson_links:
-            # Create pseudo-elements to match the expected structure
-            lesson_elements.append(link.parent)
+        for link in tree.css(SEL_LINKS):
+            if LESSON_HREF_RE.search(link.attributes.get('href') or ''):
+                # Create pseudo-elements to match the expected structure
+                lesson_elements.append(link.parent)
     
     print(f"Found {len(lesson_elements)} potential lesson elements")
 
@@ -78,30 +346,32 @@ def parse_lessons_page(html_content, current_page_url):
         lesson_url = ""
         
         # Strategy 1: Original selector
-        lesson_link_tag = item.select_one('div.archive_title a')
+        lesson_link_tag = item.css_first(SEL_TITLE_A)
         
         if not lesson_link_tag:
             # Strategy 2: Look for any link within the item
-            lesson_link_tag = item.find('a', href=re.compile(r'/lessons/'))
+            lesson_link_tag = item.css_first(SEL_LESSON_A)
         
         if not lesson_link_tag:
             # Strategy 3: Check if the item itself is a link
-            if item.name == 'a' and item.get('href') and '/lessons/' in item.get('href', ''):
+            if item.tag == 'a' and '/lessons/' in (item.attributes.get('href') or ''):
                 lesson_link_tag = item
         
-        if lesson_link_tag and lesson_link_tag.get('href'):
+        href = lesson_link_tag.attributes.get('href') if lesson_link_tag else None
+        if href:
             # Get title from link text
-            title = lesson_link_tag.get_text(strip=True)
+            title = lesson_link_tag.text(strip=True)
             
             # If title is empty, try to get it from nearby elements
             if not title:
-                # Look for title in parent or sibling elements
+                # Look for title in the parent's own text and the link attributes.
+                # Only the parent's direct text nodes are read (deep=False), not its whole subtree.
                 parent = lesson_link_tag.parent
                 if parent:
                     title_candidates = [
-                        parent.get_text(strip=True),
-                        lesson_link_tag.get('title', ''),
-                        lesson_link_tag.get('alt', '')
+                        parent.text(deep=False, strip=True),
+                        lesson_link_tag.attributes.get('title') or '',
+                        lesson_link_tag.attributes.get('alt') or ''
                     ]
                     for candidate in title_candidates:
                         if candidate and len(candidate) > 3:  # Reasonable title length
@@ -110,73 +380,75 @@ def parse_lessons_page(html_content, current_page_url):
             
             # If still no title, extract from URL
             if not title:
-                url_parts = lesson_link_tag['href'].strip('/').split('/')
+                url_parts = href.strip('/').split('/')
                 if len(url_parts) >= 2:
                     title = url_parts[-1].replace('-', ' ').title()
             
-            lesson_url = urljoin(current_page_url, lesson_link_tag['href'])
+            lesson_url = urljoin(current_page_url, href)
             
+            if lesson_url in seen_lesson_urls:
+                continue
             if title and lesson_url:
+                seen_lesson_urls.add(lesson_url)
                 print(f"  Found lesson: '{title}' -> {lesson_url}")
                 lessons_on_page.append({'title': title, 'url': lesson_url})
             else:
                 print(f"  Skipping item - missing title or URL: title='{title}', url='{lesson_url}'")
 
-    # --- 2. Find the "Next Page" Link (unchanged) ---
-    paginator_div = soup.select_one('div.paginator#paginator')
-    if paginator_div:
-        current_page_tag = paginator_div.select_one('a.selected')
-        if current_page_tag:
-            try:
-                current_page_num = int(current_page_tag.get_text(strip=True))
-                next_page_num = current_page_num + 1
-                next_link_tag = paginator_div.find('a', string=str(next_page_num))
-                
-                if next_link_tag and next_link_tag.get('href'):
-                    absolute_next_url = urljoin(current_page_url, next_link_tag['href'])
-                    if absolute_next_url != current_page_url:
-                        parsed_current = urlparse(current_page_url)
-                        parsed_next = urlparse(absolute_next_url)
-                        if parsed_current.path == parsed_next.path and parsed_current.query == parsed_next.query:
-                            next_page_link = None
-                        else:
-                            next_page_link = absolute_next_url
-            except ValueError:
-                print("Warning: Could not parse current page number from paginator link.")
-            except Exception as e:
-                print(f"Error while trying to find next page link: {e}")
-    
-    return lessons_on_page, next_page_link
+    return lessons_on_page
+
+def listing_page_url(start_url, page_num):
+    """
+    Returns the URL of listing page `page_num` by replacing the 'page' query
+    parameter of the starting listing page URL.
+    """
+    parsed = _cached_urlparse(start_url)
+    query = dict(parse_qsl(parsed.query))
+    query['page'] = page_num
+    return urlunparse(parsed._replace(query=urlencode(query)))
 
-def parse_lesson_page_for_audio(html_content, lesson_detail_url):
+def parse_lesson_page(html_content, lesson_detail_url):
     """
-    Parses a single lesson detail page to find the main audio file URL.
-    Updated to handle both <audio> tags and Flash player flashvars.
+    Parses a lesson detail page once and extracts both the lesson title and the
+    main audio file URL from it.
+    Returns a (title, audio_url) tuple; either value is None when not found.
+    Handles both <audio> tags and Flash player flashvars for the audio.
+    Runs in a worker process, so it takes and returns only plain strings.
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    tree = HTMLParser(strip_wayback_toolbar(html_content))
+
+    # --- Extract the specific lesson title for an accurate filename ---
+    title = None
+    main_title_element = tree.css_first(SEL_LESSON_TITLE)
+    if main_title_element:
+        full_title_text = main_title_element.text(strip=True)
+        # The title format is "Category: Actual Lesson Title" (e.g., "Absolute Beginners: Pulling a Car").
+        # We split by ": " to get just the "Actual Lesson Title".
+        if ": " in full_title_text:
+            title = full_title_text.split(": ", 1)[1].strip()
+        else:
+            title = full_title_text.strip()
+
+    # --- Extract the audio link ---
     audio_url = None
 
     # Strategy 1: Look for HTML5 audio tag (for absolute beginners)
-    audio_tag = soup.find('audio') 
+    audio_tag = tree.css_first(SEL_AUDIO_SRC)
     
     if audio_tag:
-        source_tag = audio_tag.find('source')
-        if source_tag and source_tag.get('src'):
-            audio_url = source_tag['src']
-        elif audio_tag.get('src'): 
-            audio_url = audio_tag['src']
+        audio_url = audio_tag.attributes['src']
     
     # Strategy 2: Look for Flash player with flashvars (for higher levels)
     if not audio_url:
         # Look for ruffle-embed or embed tags with flashvars
-        flash_elements = soup.find_all(['ruffle-embed', 'embed', 'object'])
+        flash_elements = tree.css(SEL_FLASH)
         
         for element in flash_elements:
-            flashvars = element.get('flashvars', '')
+            flashvars = element.attributes.get('flashvars') or ''
             if flashvars and 'mp3url=' in flashvars:
                 # Extract mp3url from flashvars
                 # Format: "mp3url=http://popupchinese.com/data/1382/audio.mp3"
-                match = re.search(r'mp3url=([^&\s]+)', flashvars)
+                match = MP3URL_RE.search(flashvars)
                 if match:
                     audio_url = match.group(1)
                     print(f"    Found audio URL in flashvars: {audio_url}")
@@ -184,74 +456,95 @@ def parse_lesson_page_for_audio(html_content, lesson_detail_url):
     
     # Strategy 3: Look for direct links to audio files
     if not audio_url:
-        audio_links = soup.find_all('a', href=re.compile(r'\.(mp3|wav|m4a)(\?|$)', re.I))
-        if audio_links:
-            audio_url = audio_links[0]['href']
-            print(f"    Found direct audio link: {audio_url}")
+        for link in tree.css(SEL_LINKS):
+            href = link.attributes.get('href') or ''
+            if AUDIO_EXT_RE.search(href):
+                audio_url = href
+                print(f"    Found direct audio link: {audio_url}")
+                break
 
     if audio_url:
         # Convert relative audio URLs to absolute URLs
-        absolute_url = urljoin(lesson_detail_url, audio_url)
-        print(f"    Final audio URL: {absolute_url}")
-        return absolute_url
+        audio_url = urljoin(lesson_detail_url, audio_url)
+        print(f"    Final audio URL: {audio_url}")
         
-    return None
+    return title, audio_url
 
-def file_already_exists(folder, filename):
-    """
-    Quick check if a file already exists without any processing.
-    Returns True if file exists, False otherwise.
-    """
-    filepath = os.path.join(folder, filename)
-    return os.path.exists(filepath)
-
-def download_file(url, folder, filename):
+async def download_file(client, url, folder, filename, existing_files):
     """
     Downloads a file from a given URL and saves it to a specified local folder.
+    existing_files is the set of file names already present in the folder;
+    the file name is added to it once the download succeeds.
+    The file is written to a '.part' file first and only renamed once complete,
+    so an interrupted download is resumed with a Range request on the next run
+    instead of being started over. Transient errors are retried by the client's transport.
     Includes basic error handling and a check to skip existing files.
     """
     filepath = os.path.join(folder, filename)
+    partial_path = filepath + '.part'
     
     # Skip download if the file already exists locally.
-    if os.path.exists(filepath):
+    if filename in existing_files:
         print(f"  - Skipping: {filename} already exists in {folder}.")
         return True  # Return True to indicate successful handling
 
-    max_retries = 5
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                print(f"  - Retry attempt {attempt + 1} for: {filename}")
-                time.sleep(retry_delay * attempt)  # Exponential backoff
-            
+    try:
+        partial_size = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        request_headers = None
+        if partial_size:
+            # A header-only request tells whether the partial file is already complete.
+            async with REQUEST_LIMITER:
+                h = await client.head(url, timeout=15)
+            if int(h.headers.get('Content-Length', -1)) == partial_size:
+                os.replace(partial_path, filepath)
+                existing_files.add(filename)
+                print(f"  - Partial download of {filename} was already complete.\n")
+                return True
+            print(f"  - Resuming: {filename} from byte {partial_size} of {url}")
+            request_headers = {'Range': f'bytes={partial_size}-'}
+        else:
             print(f"  - Downloading: {filename} from {url}")
-            # Use stream=True for potentially large files to avoid loading entire file into memory at once.
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-            with requests.get(url, stream=True, headers=headers, timeout=60) as r:
-                r.raise_for_status() # Will raise an exception for 4xx/5xx responses.
-                with open(filepath, 'wb') as f:
-                    # Write content in chunks.
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-            print(f"  - Successfully downloaded: {filename}\n")
-            return True  # Success, exit the retry loop
-            
-        except requests.exceptions.HTTPError as e:
-            if r.status_code == 404:
-                print(f"  - Audio file not found in archive for {filename} (404 error)")
-                return False  # Return False to indicate failure
-            else:
-                print(f"  - HTTP error downloading {filename} (attempt {attempt + 1}): {e}")
-        except requests.exceptions.RequestException as e:
-            print(f"  - Network error downloading {filename} (attempt {attempt + 1}): {e}")
-        except Exception as e:
-            print(f"  - Unexpected error downloading {filename} (attempt {attempt + 1}): {e}")
+
+        # Stream the response for potentially large files to avoid loading entire file into memory at once.
+        await REQUEST_LIMITER.acquire()
+        async with client.stream('GET', url, headers=request_headers, timeout=60) as r:
+            if r.status_code == 416:
+                # The requested range starts at the end of the file: nothing is left to fetch.
+                os.replace(partial_path, filepath)
+                existing_files.add(filename)
+                print(f"  - Partial download of {filename} was already complete.\n")
+                return True
+            r.raise_for_status() # Will raise an exception for 4xx/5xx responses.
+            # 206 means the server honoured the range, so append to the partial file;
+            # any other success status sends the whole file again.
+            mode = 'ab' if r.status_code == 206 else 'wb'
+            # Write through aiofiles so disk writes do not stall the other downloads on the event loop.
+            async with aiofiles.open(partial_path, mode, buffering=DOWNLOAD_BUFFER_SIZE) as f:
+                # Write content in large chunks.
+                async for chunk in r.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+                if hasattr(os, 'posix_fadvise') and hasattr(os, 'fdatasync'):
+                    # The audio is written once and not read back: let the kernel drop it
+                    # from the page cache instead of evicting more useful data. DONTNEED
+                    # only drops clean pages, so the data is written to disk first.
+                    await f.flush()
+                    await asyncio.to_thread(os.fdatasync, f.fileno())
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        os.replace(partial_path, filepath)
+        existing_files.add(filename)
+        print(f"  - Successfully downloaded: {filename}\n")
+        return True
+        
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            print(f"  - Audio file not found in archive for {filename} (404 error)")
+        else:
+            print(f"  - HTTP error downloading {filename}: {e}")
+    except httpx.HTTPError as e:
+        print(f"  - Network error downloading {filename}: {e}")
+    except Exception as e:
+        print(f"  - Unexpected error downloading {filename}: {e}")
     
-    print(f"  - Failed to download {filename} after {max_retries} attempts")
     return False  # Return False to indicate failure
 
 def get_user_input():
@@ -334,27 +627,147 @@ def get_user_input():
         print("Cancelled by user.")
         return None
 
+# Translation table for sanitize_filename: ASCII letters, digits, '_' and '-' map to
+# themselves, spaces become underscores, and every other ASCII character is removed.
+_ALLOWED_FILENAME_CHARS = set(string.ascii_letters + string.digits + '_-')
+_FILENAME_TABLE = {i: (chr(i) if chr(i) in _ALLOWED_FILENAME_CHARS else None) for i in range(128)}
+_FILENAME_TABLE[ord(' ')] = '_'
+# Matches everything except Unicode alphanumerics (as in str.isalnum()), '_' and '-'.
+_NON_FILENAME_CHARS_RE = re.compile(r'[^\w-]+')
+
 def sanitize_filename(title):
     """
     Converts a lesson title into a safe filename by replacing/removing invalid characters.
     Appends '.mp3' extension.
     """
-    # Replace spaces with underscores for readability.
-    s = title.strip().replace(' ', '_')
-    # Remove any character that is not alphanumeric, an underscore, or a hyphen.
-    s = ''.join(c for c in s if c.isalnum() or c in ('_', '-'))
+    # Replace spaces with underscores and drop invalid ASCII characters in a single C-level pass.
+    s = title.strip().translate(_FILENAME_TABLE)
+    if not s.isascii():
+        # Non-ASCII characters pass through the table untouched: keep only the alphanumeric ones.
+        s = _NON_FILENAME_CHARS_RE.sub('', s)
     # Ensure the filename is not empty after sanitization.
     if not s:
         s = "untitled_lesson"
     return s + '.mp3'
 
+def write_summary_json(summary_log_filename, summary_filename):
+    """
+    Consolidates the line-per-lesson summary log into a single JSON array file.
+    The log is appended to across runs, so a lesson processed more than once
+    is kept only with its most recent record, unless that record merely says the
+    file was skipped and an earlier run recorded the actual audio URL.
+    Lines that are not valid JSON, such as a record cut off by a crash, are skipped.
+    """
+    records = {}
+    with open(summary_log_filename, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"Warning: skipping unreadable line {line_number} of {summary_log_filename}: {e}")
+                continue
+            lesson_url = record['lesson_url']
+            if lesson_url in records and record['audio_url'] == 'skipped - already exists':
+                continue
+            records[lesson_url] = record
+    with open(summary_filename, 'wb') as f:
+        f.write(orjson.dumps(list(records.values()), option=orjson.OPT_INDENT_2))
+
 # --- Main Crawler Logic ---
 
-def main():
+async def process_lesson(client, page_sem, download_sem, existing_files, downloads_in_progress, parse_pool, lesson_info):
+    """
+    Fetches a single lesson detail page, extracts its title and audio link,
+    and downloads the audio file.
+    Returns a summary record for the lesson, or None if the detail page could not be fetched.
+    page_sem bounds how many detail pages are fetched at the same time,
+    download_sem bounds how many audio files are downloaded at the same time.
+    existing_files is the set of file names already present in DOWNLOAD_DIR.
+    downloads_in_progress is the set of file names another lesson task is currently downloading.
+    parse_pool is the process pool the detail page HTML is parsed in.
+    """
+    lesson_title_from_listing = lesson_info['title'] # Title extracted from the listing page.
+    lesson_detail_url = lesson_info['url'] # URL to the individual lesson detail page.
+    
+    # Quick pre-check: generate potential filename and see if it already exists
+    potential_filename = sanitize_filename(lesson_title_from_listing)
+    if potential_filename in existing_files or potential_filename in downloads_in_progress:
+        print(f"  - Skipping (already downloaded): '{lesson_title_from_listing}'")
+        # Still add to summary for completeness
+        return {
+            'title': lesson_title_from_listing,
+            'lesson_url': lesson_detail_url,
+            'audio_url': 'skipped - already exists',
+            'filename': potential_filename
+        }
+
+    async with page_sem:
+        print(f"  - Processing lesson: '{lesson_title_from_listing}' at {lesson_detail_url}")
+
+        # Fetch the HTML content of the individual lesson detail page.
+        lesson_html = await fetch(client, lesson_detail_url)
+        if not lesson_html:
+            print(f"    Could not fetch detail page for '{lesson_title_from_listing}' at {lesson_detail_url}")
+            return None
+
+        # Parse the detail page in the process pool, so parsing runs in parallel on all CPU cores
+        # while the event loop keeps the network busy.
+        loop = asyncio.get_running_loop()
+        lesson_title_for_file, audio_link = await loop.run_in_executor(
+            parse_pool, parse_lesson_page, lesson_html, lesson_detail_url)
+
+        if not lesson_title_for_file:
+            print(f"    Warning: Main lesson title 'div.lesson_title' not found. Using title from listing page.")
+            lesson_title_for_file = lesson_title_from_listing # Default to listing title
+
+        # Check again with the refined title
+        refined_filename = sanitize_filename(lesson_title_for_file)
+        if refined_filename in existing_files or refined_filename in downloads_in_progress:
+            print(f"    - Skipping (already downloaded with refined title): '{lesson_title_for_file}'")
+            return {
+                'title': lesson_title_for_file,
+                'lesson_url': lesson_detail_url,
+                'audio_url': 'skipped - already exists',
+                'filename': refined_filename
+            }
+
+        if not audio_link:
+            print(f"    No audio found for '{lesson_title_for_file}' at {lesson_detail_url}")
+            # Still add to summary for tracking
+            return {
+                'title': lesson_title_for_file,
+                'lesson_url': lesson_detail_url,
+                'audio_url': 'not found',
+                'filename': refined_filename
+            }
+
+        # Claim the file name before the next await, so a second lesson that sanitizes
+        # to the same name skips it instead of writing the same .part file.
+        downloads_in_progress.add(refined_filename)
+
+    # Download the audio file outside the detail page slot, so slow downloads
+    # do not hold back detail page fetches of the other lessons.
+    try:
+        async with download_sem:
+            download_success = await download_file(client, audio_link, DOWNLOAD_DIR, refined_filename, existing_files)
+    finally:
+        downloads_in_progress.discard(refined_filename)
+    if not download_success:
+        print(f"    Failed to download audio for '{lesson_title_for_file}'")
+    return {
+        'title': lesson_title_for_file,
+        'lesson_url': lesson_detail_url,
+        'audio_url': audio_link,
+        'filename': refined_filename
+    }
+
+async def main():
     """
     The main function that orchestrates the crawling process.
-    It iterates through lesson listing pages, fetches individual lesson pages,
-    extracts audio links and titles, and downloads the audio files.
+    It iterates through lesson listing pages, fetches the lessons of each page
+    concurrently, extracts audio links and titles, and downloads the audio files.
     """
     # Get user input for starting URL
     start_lessons_path = get_user_input()
@@ -362,135 +775,107 @@ def main():
         return
     
     # Start the crawling process from the user-specified lessons listing page.
-    current_page_full_url = urljoin(BASE_ARCHIVE_URL, start_lessons_path)
-    # List to store a summary of all lessons processed (useful for logging/debugging).
-    all_lessons_summary = []
+    start_page_full_url = urljoin(BASE_ARCHIVE_URL, start_lessons_path)
+    # Listing pages are numbered through the 'page' query parameter, so the next
+    # page URL is computed instead of being looked up in the paginator.
+    page_num = int(dict(parse_qsl(_cached_urlparse(start_page_full_url).query)).get('page', 1))
+    current_page_full_url = start_page_full_url
+    # Number of lessons written to the summary during this run.
+    lessons_recorded = 0
 
     print(f"Starting crawl from: {current_page_full_url}")
 
-    # Loop as long as there's a valid next page to visit.
-    while current_page_full_url:
-        print(f"\n--- Processing lesson listing page: {current_page_full_url} ---")
-        # Fetch the HTML content of the current listing page.
-        page_html = get_page_content(current_page_full_url)
+    # Limit how many detail pages are fetched and how many audio files are downloaded at the same time.
+    page_sem = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+    download_sem = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
 
-        if not page_html:
-            print(f"Failed to get content for {current_page_full_url}. Stopping crawl.")
-            break
+    # Read the download directory once; "already downloaded" checks are then set lookups.
+    existing_files = {entry.name for entry in os.scandir(DOWNLOAD_DIR) if entry.is_file()}
+    downloads_in_progress = set()
 
-        # Parse the listing page to get lessons and the next page link.
-        lessons_on_current_page, next_page_full_url = parse_lessons_page(page_html, current_page_full_url)
+    # Validators of pages cached by earlier runs, for conditional requests.
+    load_page_validators()
 
-        # Handle cases where no lessons are found on a page.
-        if not lessons_on_current_page and not next_page_full_url:
-            print("No lessons found on this page and no next page link. Assuming end of crawl.")
-            break
-        elif not lessons_on_current_page:
-            print(f"No lessons found on {current_page_full_url}, but a next page link was found. Proceeding to next page.")
+    # Resolve the archive host once instead of on every new connection.
+    install_dns_cache()
 
-        # Process each lesson found on the current listing page.
-        for lesson_info in lessons_on_current_page:
-            lesson_title_from_listing = lesson_info['title'] # Title extracted from the listing page.
-            lesson_detail_url = lesson_info['url'] # URL to the individual lesson detail page.
-            
-            # Quick pre-check: generate potential filename and see if it already exists
-            potential_filename = sanitize_filename(lesson_title_from_listing)
-            if file_already_exists(DOWNLOAD_DIR, potential_filename):
-                print(f"  - Skipping (already downloaded): '{lesson_title_from_listing}'")
-                # Still add to summary for completeness
-                all_lessons_summary.append({
-                    'title': lesson_title_from_listing,
-                    'lesson_url': lesson_detail_url,
-                    'audio_url': 'skipped - already exists',
-                    'filename': potential_filename
-                })
-                continue  # Skip to next lesson without fetching detail page
-            
-            print(f"  - Processing lesson: '{lesson_title_from_listing}' at {lesson_detail_url}")
-
-            # Fetch the HTML content of the individual lesson detail page.
-            lesson_html = get_page_content(lesson_detail_url)
-            if lesson_html:
-                lesson_detail_soup = BeautifulSoup(lesson_html, 'html.parser')
-                
-                # --- Extract the specific lesson title from the detail page for accurate filename ---
-                main_title_element = lesson_detail_soup.find('div', class_='lesson_title')
-                
-                lesson_title_for_file = lesson_title_from_listing # Default to listing title
-
-                if main_title_element:
-                    full_title_text = main_title_element.get_text(strip=True)
-                    # The title format is "Category: Actual Lesson Title" (e.g., "Absolute Beginners: Pulling a Car").
-                    # We split by ": " to get just the "Actual Lesson Title".
-                    if ": " in full_title_text:
-                        lesson_title_for_file = full_title_text.split(": ", 1)[1].strip()
-                    else:
-                        lesson_title_for_file = full_title_text.strip()
-                else:
-                    print(f"    Warning: Main lesson title 'div.lesson_title' not found. Using title from listing page.")
-
-                # Check again with the refined title
-                refined_filename = sanitize_filename(lesson_title_for_file)
-                if file_already_exists(DOWNLOAD_DIR, refined_filename):
-                    print(f"    - Skipping (already downloaded with refined title): '{lesson_title_for_file}'")
-                    all_lessons_summary.append({
-                        'title': lesson_title_for_file,
-                        'lesson_url': lesson_detail_url,
-                        'audio_url': 'skipped - already exists',
-                        'filename': refined_filename
-                    })
-                    continue
-
-                # --- Extract the Audio Link from the lesson detail page ---
-                audio_link = parse_lesson_page_for_audio(lesson_html, lesson_detail_url)
-                if audio_link:
-                    # Add lesson details to the summary list.
-                    all_lessons_summary.append({
-                        'title': lesson_title_for_file,
-                        'lesson_url': lesson_detail_url,
-                        'audio_url': audio_link,
-                        'filename': refined_filename
-                    })
-                    # Download the audio file.
-                    download_success = download_file(audio_link, DOWNLOAD_DIR, refined_filename)
-                    if not download_success:
-                        print(f"    Failed to download audio for '{lesson_title_for_file}'")
-                else:
-                    print(f"    No audio found for '{lesson_title_for_file}' at {lesson_detail_url}")
-                    # Still add to summary for tracking
-                    all_lessons_summary.append({
-                        'title': lesson_title_for_file,
-                        'lesson_url': lesson_detail_url,
-                        'audio_url': 'not found',
-                        'filename': refined_filename
-                    })
-            else:
-                print(f"    Could not fetch detail page for '{lesson_title_from_listing}' at {lesson_detail_url}")
+    # Summary records are appended to this file one JSON object per line while crawling.
+    summary_log_filename = os.path.join(DOWNLOAD_DIR, 'popup_chinese_audio_summary.ndjson')
+    try:
+        with open(summary_log_filename, 'a+b') as summary_log:
+            # A crash can leave the last record without its newline: start this run's records on a new line.
+            if summary_log.seek(0, os.SEEK_END):
+                summary_log.seek(-1, os.SEEK_END)
+                if summary_log.read(1) != b'\n':
+                    summary_log.write(b'\n')
+            # Detail pages are parsed in worker processes. No more than MAX_CONCURRENT_PAGES pages
+            # are fetched at once, so more workers than that would sit idle. The workers are not
+            # forked from this process, which is already running the event loop and its threads.
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            with ProcessPoolExecutor(
+                max_workers=min(MAX_CONCURRENT_PAGES, os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context(start_method),
+            ) as parse_pool:
+                # One client for the whole crawl so connections to the archive are pooled and kept alive.
+                async with create_client() as client:
+                    # Start fetching the first listing page.
+                    page_task = asyncio.create_task(fetch(client, current_page_full_url))
+
+                    # Loop until a listing page without lessons is reached.
+                    while True:
+                        print(f"\n--- Processing lesson listing page: {current_page_full_url} ---")
+                        # Wait for the HTML content of the current listing page.
+                        page_html = await page_task
+
+                        if not page_html:
+                            print(f"Failed to get content for {current_page_full_url}. Stopping crawl.")
+                            break
 
-            # Be polite: add a small delay between fetching individual lesson pages.
-            time.sleep(3) # Wait 3 seconds to avoid overwhelming the server (increased from 2)
+                        # Parse the listing page to get its lessons.
+                        lessons_on_current_page = parse_lessons_page(page_html, current_page_full_url)
 
-        # Move to the next lesson listing page if a link was found.
-        current_page_full_url = next_page_full_url
-        if current_page_full_url:
-            print(f"Moving to next lesson listing page: {current_page_full_url}")
-            # Add a longer delay before moving to the next listing page.
-            time.sleep(5) # Wait 5 seconds before next listing page request.
-        else:
-            print("No more listing pages to crawl. Crawl completed.")
+                        # A page without lessons means we went past the last listing page.
+                        if not lessons_on_current_page:
+                            print("No lessons found on this page. No more listing pages to crawl. Crawl completed.")
+                            break
+
+                        # Prefetch the next listing page while the lessons of this page are processed.
+                        page_num += 1
+                        next_page_full_url = listing_page_url(start_page_full_url, page_num)
+                        page_task = asyncio.create_task(fetch(client, next_page_full_url))
+
+                        # Process all lessons found on the current listing page concurrently.
+                        tasks = [process_lesson(client, page_sem, download_sem, existing_files, downloads_in_progress, parse_pool, lesson_info) for lesson_info in lessons_on_current_page]
+                        # Append each lesson to the summary log as soon as it is done, so nothing is lost if the crawl stops.
+                        for task in asyncio.as_completed(tasks):
+                            record = await task
+                            if record:
+                                summary_log.write(orjson.dumps(record) + b'\n')
+                                summary_log.flush()
+                                lessons_recorded += 1
+
+                        # Move to the next lesson listing page.
+                        current_page_full_url = next_page_full_url
+                        print(f"Moving to next lesson listing page: {current_page_full_url}")
+    finally:
+        # Saved even when the crawl is interrupted, so the pages cached so far are
+        # requested conditionally by the next run instead of being orphaned.
+        try:
+            save_page_validators()
+        except Exception as e:
+            print(f"Error saving page cache validators: {e}")
 
     print("\n--- Final Crawling Summary ---")
-    print(f"Total lessons with audio identified and attempted download: {len(all_lessons_summary)}")
+    print(f"Total lessons with audio identified and attempted download: {lessons_recorded}")
 
     # Save a summary of all processed lessons to a JSON file in the download directory.
     summary_filename = os.path.join(DOWNLOAD_DIR, 'popup_chinese_audio_summary.json')
     try:
-        with open(summary_filename, 'w', encoding='utf-8') as f:
-            json.dump(all_lessons_summary, f, indent=4, ensure_ascii=False)
+        write_summary_json(summary_log_filename, summary_filename)
         print(f"Detailed summary saved to {summary_filename}")
     except Exception as e:
         print(f"Error saving summary file: {e}")
 
 # Entry point for the script when executed.
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())